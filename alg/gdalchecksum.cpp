@@ -42,6 +42,84 @@
 
 CPL_CVSID("$Id$")
 
+constexpr int anPrimes[11] = {7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43};
+
+/************************************************************************/
+/*                          ChecksumValueAsInt()                        */
+/************************************************************************/
+
+static inline int ChecksumValueAsInt(int nVal)
+{
+    return nVal;
+}
+
+static inline int ChecksumValueAsInt(double dfVal)
+{
+    if (CPLIsNan(dfVal) || CPLIsInf(dfVal))
+    {
+        // Most compilers seem to cast NaN or Inf to 0x80000000.
+        // but VC7 is an exception. So we force the result
+        // of such a cast.
+        return 0x80000000;
+    }
+
+    // Standard behavior of GDALCopyWords when converting
+    // from floating point to Int32.
+    dfVal += 0.5;
+
+    if (dfVal < -2147483647.0)
+        return -2147483647;
+    else if (dfVal > 2147483647)
+        return 2147483647;
+    return static_cast<GInt32>(floor(dfVal));
+}
+
+/************************************************************************/
+/*                          ChecksumValues()                            */
+/************************************************************************/
+
+// Accumulate nCount values into nChecksum, cycling through anPrimes[]
+// from index iPrime. Full cycles of the primes are unrolled, so that the
+// modulo operations are done against constants and can be turned into
+// multiplications by the compiler, instead of integer divisions.
+template <class T>
+static void ChecksumValues(const T *paValues, int nCount, int &nChecksum,
+                           int &iPrime)
+{
+    int i = 0;
+    for (; i < nCount && iPrime != 0; ++i)
+    {
+        nChecksum += ChecksumValueAsInt(paValues[i]) % anPrimes[iPrime++];
+        if (iPrime > 10)
+            iPrime = 0;
+    }
+
+    for (; i + 11 <= nCount; i += 11)
+    {
+        nChecksum += ChecksumValueAsInt(paValues[i]) % 7 +
+                     ChecksumValueAsInt(paValues[i + 1]) % 11 +
+                     ChecksumValueAsInt(paValues[i + 2]) % 13 +
+                     ChecksumValueAsInt(paValues[i + 3]) % 17 +
+                     ChecksumValueAsInt(paValues[i + 4]) % 19 +
+                     ChecksumValueAsInt(paValues[i + 5]) % 23 +
+                     ChecksumValueAsInt(paValues[i + 6]) % 29 +
+                     ChecksumValueAsInt(paValues[i + 7]) % 31 +
+                     ChecksumValueAsInt(paValues[i + 8]) % 37 +
+                     ChecksumValueAsInt(paValues[i + 9]) % 41 +
+                     ChecksumValueAsInt(paValues[i + 10]) % 43;
+        nChecksum &= 0xffff;
+    }
+
+    for (; i < nCount; ++i)
+    {
+        nChecksum += ChecksumValueAsInt(paValues[i]) % anPrimes[iPrime++];
+        if (iPrime > 10)
+            iPrime = 0;
+    }
+
+    nChecksum &= 0xffff;
+}
+
 /************************************************************************/
 /*                         GDALChecksumImage()                          */
 /************************************************************************/
@@ -69,8 +147,6 @@ int CPL_STDCALL GDALChecksumImage(GDALRasterBandH hBand, int nXOff, int nYOff,
 {
     VALIDATE_POINTER1(hBand, "GDALChecksumImage", 0);
 
-    const static int anPrimes[11] = {7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43};
-
     int nChecksum = 0;
     int iPrime = 0;
     const GDALDataType eDataType = GDALGetRasterDataType(hBand);
@@ -101,38 +177,7 @@ int CPL_STDCALL GDALChecksumImage(GDALRasterBandH hBand, int nXOff, int nYOff,
                 break;
             }
             const int nCount = bComplex ? nXSize * 2 : nXSize;
-
-            for (int i = 0; i < nCount; i++)
-            {
-                double dfVal = padfLineData[i];
-                int nVal;
-                if (CPLIsNan(dfVal) || CPLIsInf(dfVal))
-                {
-                    // Most compilers seem to cast NaN or Inf to 0x80000000.
-                    // but VC7 is an exception. So we force the result
-                    // of such a cast.
-                    nVal = 0x80000000;
-                }
-                else
-                {
-                    // Standard behavior of GDALCopyWords when converting
-                    // from floating point to Int32.
-                    dfVal += 0.5;
-
-                    if (dfVal < -2147483647.0)
-                        nVal = -2147483647;
-                    else if (dfVal > 2147483647)
-                        nVal = 2147483647;
-                    else
-                        nVal = static_cast<GInt32>(floor(dfVal));
-                }
-
-                nChecksum += nVal % anPrimes[iPrime++];
-                if (iPrime > 10)
-                    iPrime = 0;
-
-                nChecksum &= 0xffff;
-            }
+            ChecksumValues(padfLineData, nCount, nChecksum, iPrime);
         }
 
         CPLFree(padfLineData);
@@ -214,14 +259,8 @@ int CPL_STDCALL GDALChecksumImage(GDALRasterBandH hBand, int nXOff, int nYOff,
                     iPrime = (nValsPerIter * (iY * nXSize + iXStart)) % 11;
                     const int nOffset =
                         nValsPerIter * (iY - iYStart) * nChunkActualXSize;
-                    for (int i = 0; i < xIters; ++i)
-                    {
-                        nChecksum +=
-                            panChunkData[nOffset + i] % anPrimes[iPrime++];
-                        if (iPrime > 10)
-                            iPrime = 0;
-                    }
-                    nChecksum &= 0xffff;
+                    ChecksumValues(panChunkData + nOffset, xIters, nChecksum,
+                                   iPrime);
                 }
             }
         }
@@ -252,15 +291,7 @@ int CPL_STDCALL GDALChecksumImage(GDALRasterBandH hBand, int nXOff, int nYOff,
                 break;
             }
             const int nCount = bComplex ? nXSize * 2 : nXSize;
-
-            for (int i = 0; i < nCount; i++)
-            {
-                nChecksum += panLineData[i] % anPrimes[iPrime++];
-                if (iPrime > 10)
-                    iPrime = 0;
-
-                nChecksum &= 0xffff;
-            }
+            ChecksumValues(panLineData, nCount, nChecksum, iPrime);
         }
 
         CPLFree(panLineData);
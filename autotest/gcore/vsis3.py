@@ -28,12 +28,13 @@
 # DEALINGS IN THE SOFTWARE.
 ###############################################################################
 
+import hashlib
+import hmac
 import json
 import os.path
 import stat
 import sys
-import tempfile
-import urllib
+import urllib.parse
 
 import gdaltest
 import pytest
@@ -49,6 +50,148 @@ def open_for_read(uri):
     return gdal.VSIFOpenExL(uri, "rb", 1)
 
 
+def read_and_close(uri, size=4):
+    """
+    Opens uri, reads its first size bytes and closes it.
+    Returns the bytes read, or None if the file cannot be opened.
+    """
+    f = open_for_read(uri)
+    if f is None:
+        return None
+    try:
+        return gdal.VSIFReadL(1, size, f)
+    finally:
+        gdal.VSIFCloseL(f)
+
+
+def get_aws_sign4_signature(
+    secret_access_key,
+    host,
+    canonical_uri,
+    canonical_query_string="",
+    headers=None,
+    payload_hash=hashlib.sha256(b"").hexdigest(),
+    service="s3",
+):
+    """
+    Computes the AWS signature version 4 of a GET request, the same way GDAL
+    does it with the AWS_TIMESTAMP and AWS_DEFAULT_REGION values of
+    general_s3_options. Returns a (signed_headers, signature) tuple.
+    """
+
+    timestamp = general_s3_options["AWS_TIMESTAMP"]
+    region = general_s3_options["AWS_DEFAULT_REGION"]
+
+    headers = headers or {}
+    headers = {"host": host, **headers}
+    signed_headers = ";".join(sorted(headers))
+    canonical_request = "\n".join(
+        [
+            "GET",
+            canonical_uri,
+            canonical_query_string,
+            "".join("%s:%s\n" % (k, headers[k]) for k in sorted(headers)),
+            signed_headers,
+            payload_hash,
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            timestamp,
+            f"{timestamp[0:8]}/{region}/{service}/aws4_request",
+            hashlib.sha256(canonical_request.encode("ascii")).hexdigest(),
+        ]
+    )
+
+    key = ("AWS4" + secret_access_key).encode("ascii")
+    for val in (timestamp[0:8], region, service, "aws4_request"):
+        key = hmac.new(key, val.encode("ascii"), hashlib.sha256).digest()
+    signature = hmac.new(
+        key, string_to_sign.encode("ascii"), hashlib.sha256
+    ).hexdigest()
+    return signed_headers, signature
+
+
+def get_aws_sign4_authorization(
+    access_key_id,
+    secret_access_key,
+    host,
+    canonical_uri,
+    canonical_query_string="",
+    session_token=None,
+    headers=None,
+    service="s3",
+):
+    """
+    Returns the expected value of the Authorization header of a GET request
+    issued by GDAL. headers are the additional x-amz-* headers to sign.
+    """
+
+    headers = dict(headers or {})
+    if service == "s3":
+        headers["x-amz-content-sha256"] = hashlib.sha256(b"").hexdigest()
+        headers["x-amz-date"] = general_s3_options["AWS_TIMESTAMP"]
+    if session_token:
+        headers["x-amz-security-token"] = session_token
+    signed_headers, signature = get_aws_sign4_signature(
+        secret_access_key,
+        host,
+        canonical_uri,
+        canonical_query_string,
+        headers,
+        service=service,
+    )
+    timestamp = general_s3_options["AWS_TIMESTAMP"]
+    region = general_s3_options["AWS_DEFAULT_REGION"]
+    return (
+        f"AWS4-HMAC-SHA256 Credential={access_key_id}/{timestamp[0:8]}/"
+        f"{region}/{service}/aws4_request,SignedHeaders={signed_headers},"
+        f"Signature={signature}"
+    )
+
+
+def get_aws_sign4_presigned_url(
+    host,
+    canonical_uri,
+    expires="3600",
+    session_token=None,
+    access_key_id=None,
+    secret_access_key=None,
+):
+    """
+    Returns the expected result of gdal.GetSignedURL(). The credentials
+    default to the ones of general_s3_options.
+    """
+
+    if access_key_id is None:
+        access_key_id = general_s3_options["AWS_ACCESS_KEY_ID"]
+    if secret_access_key is None:
+        secret_access_key = general_s3_options["AWS_SECRET_ACCESS_KEY"]
+    timestamp = general_s3_options["AWS_TIMESTAMP"]
+    region = general_s3_options["AWS_DEFAULT_REGION"]
+    params = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": access_key_id
+        + f"%2F{timestamp[0:8]}%2F{region}%2Fs3%2Faws4_request",
+        "X-Amz-Date": timestamp,
+        "X-Amz-Expires": expires,
+        "X-Amz-SignedHeaders": "host",
+    }
+    if session_token:
+        params["X-Amz-Security-Token"] = session_token
+    _, params["X-Amz-Signature"] = get_aws_sign4_signature(
+        secret_access_key,
+        host,
+        canonical_uri,
+        "&".join("%s=%s" % (k, params[k]) for k in sorted(params)),
+        payload_hash="UNSIGNED-PAYLOAD",
+    )
+    return f"http://{host}{canonical_uri}?" + "&".join(
+        "%s=%s" % (k, params[k]) for k in sorted(params)
+    )
+
+
 general_s3_options = {
     # To avoid user AWS credentials in ~/.aws/credentials
     # and ~/.aws/config to mess up our tests
@@ -80,6 +223,14 @@ def aws_test_config_as_config_options_or_credentials(request):
 
 @pytest.fixture()
 def aws_test_config():
+    """Sets general_s3_options as global configuration options for the
+    duration of a test.
+
+    This is deliberately function-scoped: the tests that do not request it
+    (test_vsis3_extra_1, or the gdaltest.credentials() variant of
+    aws_test_config_as_config_options_or_credentials) must not see those
+    options."""
+
     options = general_s3_options
 
     with gdaltest.config_options(options, thread_local=False):
@@ -107,6 +258,36 @@ def webserver_port():
         webserver.server_stop(webserver_process, webserver_port)
 
 
+@pytest.fixture(scope="module")
+def webserver_host(webserver_port):
+    """Host of the test webserver, as used by the STS and EC2 endpoints"""
+    return f"localhost:{webserver_port}"
+
+
+@pytest.fixture(scope="module")
+def webserver_url(webserver_host):
+    """Root URL of the test webserver"""
+    return f"http://{webserver_host}"
+
+
+@pytest.fixture()
+def vsimem_files():
+    """Creates /vsimem/ files from a {filename: content} dictionary, and
+    removes them at the end of the test"""
+
+    filenames = []
+
+    def create(files):
+        for filename, content in files.items():
+            gdal.FileFromMemBuffer(filename, content)
+            filenames.append(filename)
+
+    yield create
+
+    for filename in filenames:
+        gdal.Unlink(filename)
+
+
 ###############################################################################
 
 
@@ -313,47 +494,19 @@ def test_vsis3_1(aws_test_config):
 ###############################################################################
 
 
-def get_s3_fake_bucket_resource_method(request):
-    request.protocol_version = "HTTP/1.1"
-
-    if "Authorization" not in request.headers:
-        sys.stderr.write("Bad headers: %s\n" % str(request.headers))
-        request.send_response(403)
-        return
-    expected_authorization_8080 = (
-        "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/"
-        "s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-        "x-amz-date,Signature="
-        "38901846b865b12ac492bc005bb394ca8d60c098b68db57c084fac686a932f9e"
-    )
-    expected_authorization_8081 = (
-        "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/"
-        "s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-        "x-amz-date,Signature="
-        "9f623b7ffce76188a456c70fb4813eb31969e88d130d6b4d801b3accbf050d6c"
-    )
-    expected_authorization_8082 = (
-        "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/"
-        "s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;"
-        "x-amz-security-token,Signature="
-        "a78e2d484679a19bec940a72d40c7fda37d1651a8ab82a6ed8fd7be46a53afb1"
-    )
-    actual_authorization = request.headers["Authorization"]
-    if actual_authorization not in (
-        expected_authorization_8080,
-        expected_authorization_8081,
-        expected_authorization_8082,
-    ):
-        sys.stderr.write("Bad Authorization: '%s'\n" % str(actual_authorization))
-        request.send_response(403)
-        return
+def get_s3_fake_bucket_resource_expected_headers(webserver_port, session_token=None):
+    """Returns the expected headers of a GET /s3_fake_bucket/resource request
+    signed with the credentials of general_s3_options"""
 
-    request.send_response(200)
-    request.send_header("Content-type", "text/plain")
-    request.send_header("Content-Length", 3)
-    request.send_header("Connection", "close")
-    request.end_headers()
-    request.wfile.write("""foo""".encode("ascii"))
+    return {
+        "Authorization": get_aws_sign4_authorization(
+            "AWS_ACCESS_KEY_ID",
+            "AWS_SECRET_ACCESS_KEY",
+            "127.0.0.1:%d" % webserver_port,
+            "/s3_fake_bucket/resource",
+            session_token=session_token,
+        )
+    }
 
 
 ###############################################################################
@@ -362,27 +515,9 @@ def get_s3_fake_bucket_resource_method(request):
 
 def test_vsis3_2(aws_test_config_as_config_options_or_credentials, webserver_port):
     signed_url = gdal.GetSignedURL("/vsis3/s3_fake_bucket/resource")
-    expected_url_8080 = (
-        "http://127.0.0.1:8080/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
-        "&X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z&X-Amz-Expires=3600"
-        "&X-Amz-Signature="
-        "dca239dd95f72ff8c37c15c840afc54cd19bdb07f7aaee2223108b5b0ad35da8"
-        "&X-Amz-SignedHeaders=host"
-    )
-    expected_url_8081 = (
-        "http://127.0.0.1:8081/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
-        "&X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z&X-Amz-Expires=3600"
-        "&X-Amz-Signature="
-        "ef5216bc5971863414c69f6ca095276c0d62c0da97fa4f6ab80c30bd7fc146ac"
-        "&X-Amz-SignedHeaders=host"
-    )
-    assert signed_url in (expected_url_8080, expected_url_8081)
+    assert signed_url == get_aws_sign4_presigned_url(
+        "127.0.0.1:%d" % webserver_port, "/s3_fake_bucket/resource"
+    )
 
     gdal.VSICurlClearCache()
 
@@ -390,7 +525,10 @@ def test_vsis3_2(aws_test_config_as_config_options_or_credentials, webserver_por
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
 
     with webserver.install_http_handler(handler):
@@ -405,7 +543,10 @@ def test_vsis3_2(aws_test_config_as_config_options_or_credentials, webserver_por
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
         f = open_for_read("/vsis3_streaming/s3_fake_bucket/resource")
@@ -424,25 +565,15 @@ def test_vsis3_2(aws_test_config_as_config_options_or_credentials, webserver_por
             sys.stderr.write("Bad headers: %s\n" % str(request.headers))
             request.send_response(403)
             return
-        expected_authorization_8080 = (
-            "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1"
-            "/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-            "x-amz-date;x-amz-security-token,"
-            "Signature="
-            "464a21835038b4f4d292b6463b8a005b9aaa980513aa8c42fc170abb733dce85"
-        )
-        expected_authorization_8081 = (
-            "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1"
-            "/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-            "x-amz-date;x-amz-security-token,"
-            "Signature="
-            "b10e91575186342f9f2acfc91c4c2c9938c4a9e8cdcbc043d09d59d9641ad7fb"
+        expected_authorization = get_aws_sign4_authorization(
+            "AWS_ACCESS_KEY_ID",
+            "AWS_SECRET_ACCESS_KEY",
+            "127.0.0.1:%d" % webserver_port,
+            "/s3_fake_bucket_with_session_token/resource",
+            session_token="AWS_SESSION_TOKEN",
         )
         actual_authorization = request.headers["Authorization"]
-        if actual_authorization not in (
-            expected_authorization_8080,
-            expected_authorization_8081,
-        ):
+        if actual_authorization != expected_authorization:
             sys.stderr.write("Bad Authorization: '%s'\n" % str(actual_authorization))
             request.send_response(403)
             return
@@ -777,25 +908,15 @@ def test_vsis3_2(aws_test_config_as_config_options_or_credentials, webserver_por
             sys.stderr.write("Bad headers: %s\n" % str(request.headers))
             request.send_response(403)
             return
-        expected_authorization_8080 = (
-            "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/"
-            "s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-            "x-amz-date;x-amz-request-payer,"
-            "Signature="
-            "cf713a394e1b629ac0e468d60d3d4a12f5236fd72d21b6005c758b0dfc7049cd"
-        )
-        expected_authorization_8081 = (
-            "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/"
-            "s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;"
-            "x-amz-date;x-amz-request-payer,"
-            "Signature="
-            "4756166679008a1a40cd6ff91dbbef670a71c11bf8e3c998dd7385577c3ac4d9"
+        expected_authorization = get_aws_sign4_authorization(
+            "AWS_ACCESS_KEY_ID",
+            "AWS_SECRET_ACCESS_KEY",
+            "127.0.0.1:%d" % webserver_port,
+            "/s3_fake_bucket_with_requester_pays/resource",
+            headers={"x-amz-request-payer": "requester"},
         )
         actual_authorization = request.headers["Authorization"]
-        if actual_authorization not in (
-            expected_authorization_8080,
-            expected_authorization_8081,
-        ):
+        if actual_authorization != expected_authorization:
             sys.stderr.write("Bad Authorization: '%s'\n" % str(actual_authorization))
             request.send_response(403)
             return
@@ -3255,7 +3376,7 @@ def test_vsis3_sync_etag(aws_test_config, webserver_port):
         expected_headers={"Content-Length": "3", "x-amz-storage-class": "GLACIER"},
     )
 
-    gdal.FileFromMemBuffer("/vsimem/testsync.txt", "foo")
+    gdal.FileFromMemBuffer("/vsimem/testsync.txt", memoryview(b"foo"))
 
     def cbk(pct, _, tab):
         assert pct > tab[0]
@@ -3307,7 +3428,7 @@ def test_vsis3_sync_etag(aws_test_config, webserver_port):
         )
 
     # Modify target file, and redo synchronization
-    gdal.FileFromMemBuffer("/vsimem/testsync.txt", "bar")
+    gdal.FileFromMemBuffer("/vsimem/testsync.txt", memoryview(b"bar"))
 
     handler = webserver.SequentialHandler()
     handler.add(
@@ -4174,57 +4295,179 @@ def test_vsis3_random_write_gtiff_create_copy(aws_test_config, webserver_port):
 
 
 ###############################################################################
-# Read credentials from simulated ~/.aws/credentials
+# Canned responses of the credential providers
+
+
+# Role assumed with AssumeRoleWithWebIdentity, and its URL-encoded form as
+# found in the STS request
+AWS_ROLE_ARN = "arn:aws:iam:role/test"
+AWS_ROLE_ARN_ENCODED = urllib.parse.quote_plus(AWS_ROLE_ARN)
+
+# Role assumed with AssumeRole from a source profile
+ASSUMED_ROLE_ARN = "arn:aws:iam::557268267719:role/role"
+ASSUMED_ROLE_ARN_ENCODED = urllib.parse.quote_plus(ASSUMED_ROLE_ARN)
+
+
+def get_assume_role_with_web_identity_response(expiration):
+    """Returns the response of a STS AssumeRoleWithWebIdentity request, with
+    the AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY and AWS_SESSION_TOKEN
+    temporary credentials"""
+
+    return f"""<AssumeRoleWithWebIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <AssumeRoleWithWebIdentityResult>
+    <SubjectFromWebIdentityToken>amzn1.account.AF6RHO7KZU5XRVQJGXK6HB56KR2A</SubjectFromWebIdentityToken>
+    <Audience>client.5498841531868486423.1548@apps.example.com</Audience>
+    <AssumedRoleUser>
+      <Arn>arn:aws:sts::123456789012:assumed-role/FederatedWebIdentityRole/app1</Arn>
+      <AssumedRoleId>AROACLKWSDQRAOEXAMPLE:app1</AssumedRoleId>
+    </AssumedRoleUser>
+    <Credentials>
+      <SessionToken>AWS_SESSION_TOKEN</SessionToken>
+      <SecretAccessKey>AWS_SECRET_ACCESS_KEY</SecretAccessKey>
+      <Expiration>{expiration}</Expiration>
+      <AccessKeyId>AWS_ACCESS_KEY_ID</AccessKeyId>
+    </Credentials>
+    <SourceIdentity>SourceIdentityValue</SourceIdentity>
+    <Provider>www.amazon.com</Provider>
+  </AssumeRoleWithWebIdentityResult>
+  <ResponseMetadata>
+    <RequestId>ad4156e9-bce1-11e2-82e6-6b6efEXAMPLE</RequestId>
+  </ResponseMetadata>
+</AssumeRoleWithWebIdentityResponse>""".encode(
+        "ascii"
+    )
+
+
+def get_assume_role_response(credentials_prefix, expiration):
+    """Returns the response of a STS AssumeRole request, with the
+    {credentials_prefix}_ACCESS_KEY_ID, {credentials_prefix}_SECRET_ACCESS_KEY
+    and {credentials_prefix}_SESSION_TOKEN temporary credentials"""
+
+    return f"""<AssumeRoleResponse><AssumeRoleResult><Credentials>
+    <AccessKeyId>{credentials_prefix}_ACCESS_KEY_ID</AccessKeyId>
+    <SecretAccessKey>{credentials_prefix}_SECRET_ACCESS_KEY</SecretAccessKey>
+    <SessionToken>{credentials_prefix}_SESSION_TOKEN</SessionToken>
+    <Expiration>{expiration}</Expiration>
+</Credentials></AssumeRoleResult></AssumeRoleResponse>""".encode(
+        "ascii"
+    )
+
+
+ASSUME_ROLE_EXPIRED_RESPONSE = get_assume_role_response("TEMP", "1970-01-01T01:00:00Z")
+
+ASSUME_ROLE_NON_EXPIRED_RESPONSE = get_assume_role_response(
+    "TEMP", "9999-01-01T01:00:00Z"
+)
+
+ASSUME_ROLE_ANOTHER_NON_EXPIRED_RESPONSE = get_assume_role_response(
+    "ANOTHER_TEMP", "3000-01-01T01:00:00Z"
+)
+
+
+EC2_CREDENTIALS_RESPONSE = b"""{
+"AccessKeyId": "AWS_ACCESS_KEY_ID",
+"SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
+"Expiration": "3000-01-01T00:00:00Z"
+}"""
+
+EC2_EXPIRED_CREDENTIALS_RESPONSE = b"""{
+"AccessKeyId": "AWS_ACCESS_KEY_ID",
+"SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
+"Expiration": "1970-01-01T00:00:00Z"
+}"""
+
+EC2_CREDENTIALS_WITH_SESSION_TOKEN_RESPONSE = b"""{
+"AccessKeyId": "AWS_ACCESS_KEY_ID",
+"SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
+"Token": "AWS_SESSION_TOKEN",
+"Expiration": "5000-01-01T00:00:00Z"
+}"""
 
 
-def test_vsis3_read_credentials_file(aws_test_config, webserver_port):
+###############################################################################
+# Content of simulated ~/.aws/credentials and ~/.aws/config files
 
-    options = {
-        "AWS_SECRET_ACCESS_KEY": "",
-        "AWS_ACCESS_KEY_ID": "",
-        "CPL_AWS_CREDENTIALS_FILE": "/vsimem/aws_credentials",
-    }
 
-    gdal.VSICurlClearCache()
+AWS_CREDENTIALS_FILE_CONTENT = b"""
+[unrelated]
+aws_access_key_id = foo
+aws_secret_access_key = bar
+[default]
+aws_access_key_id = AWS_ACCESS_KEY_ID
+aws_secret_access_key = AWS_SECRET_ACCESS_KEY
+[unrelated]
+aws_access_key_id = foo
+aws_secret_access_key = bar
+"""
 
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_credentials",
-        """
+AWS_CONFIG_FILE_CONTENT = b"""
 [unrelated]
 aws_access_key_id = foo
 aws_secret_access_key = bar
 [default]
 aws_access_key_id = AWS_ACCESS_KEY_ID
 aws_secret_access_key = AWS_SECRET_ACCESS_KEY
+region = us-east-1
 [unrelated]
 aws_access_key_id = foo
 aws_secret_access_key = bar
-""",
+"""
+
+AWS_CONFIG_FILE_INCONSISTENT_CONTENT = b"""
+[unrelated]
+aws_access_key_id = foo
+aws_secret_access_key = bar
+[default]
+aws_access_key_id = AWS_ACCESS_KEY_ID_inconsistent
+aws_secret_access_key = AWS_SECRET_ACCESS_KEY_inconsistent
+region = us-east-1
+[unrelated]
+aws_access_key_id = foo
+aws_secret_access_key = bar
+"""
+
+
+###############################################################################
+# Read credentials from simulated ~/.aws/credentials
+
+
+def test_vsis3_read_credentials_file(aws_test_config, webserver_port, vsimem_files):
+
+    options = {
+        "AWS_SECRET_ACCESS_KEY": "",
+        "AWS_ACCESS_KEY_ID": "",
+        "CPL_AWS_CREDENTIALS_FILE": "/vsimem/aws_credentials",
+    }
+
+    gdal.VSICurlClearCache()
+
+    vsimem_files(
+        {
+            "/vsimem/aws_credentials": AWS_CREDENTIALS_FILE_CONTENT,
+        }
     )
 
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
-
-    assert data == "foo"
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    gdal.Unlink("/vsimem/aws_credentials")
+    assert data == b"foo"
 
 
 ###############################################################################
 # Read credentials from simulated  ~/.aws/config
 
 
-def test_vsis3_read_config_file(aws_test_config, webserver_port):
+def test_vsis3_read_config_file(aws_test_config, webserver_port, vsimem_files):
     options = {
         "AWS_SECRET_ACCESS_KEY": "",
         "AWS_ACCESS_KEY_ID": "",
@@ -4233,45 +4476,35 @@ def test_vsis3_read_config_file(aws_test_config, webserver_port):
 
     gdal.VSICurlClearCache()
 
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_config",
-        """
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-[default]
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-region = us-east-1
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-""",
+    vsimem_files(
+        {
+            "/vsimem/aws_config": AWS_CONFIG_FILE_CONTENT,
+        }
     )
 
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    assert data == "foo"
-
-    gdal.Unlink("/vsimem/aws_config")
+    assert data == b"foo"
 
 
 ###############################################################################
 # Read credentials from simulated ~/.aws/credentials and ~/.aws/config
 
 
-def test_vsis3_read_credentials_config_file(aws_test_config, webserver_port):
+def test_vsis3_read_credentials_config_file(
+    aws_test_config, webserver_port, vsimem_files
+):
     options = {
         "AWS_SECRET_ACCESS_KEY": "",
         "AWS_ACCESS_KEY_ID": "",
@@ -4281,54 +4514,27 @@ def test_vsis3_read_credentials_config_file(aws_test_config, webserver_port):
 
     gdal.VSICurlClearCache()
 
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_credentials",
-        """
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-[default]
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-""",
-    )
-
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_config",
-        """
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-[default]
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-region = us-east-1
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-""",
+    vsimem_files(
+        {
+            "/vsimem/aws_credentials": AWS_CREDENTIALS_FILE_CONTENT,
+            "/vsimem/aws_config": AWS_CONFIG_FILE_CONTENT,
+        }
     )
 
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    assert data == "foo"
-
-    gdal.Unlink("/vsimem/aws_credentials")
-    gdal.Unlink("/vsimem/aws_config")
+    assert data == b"foo"
 
 
 ###############################################################################
@@ -4382,21 +4588,22 @@ aws_secret_access_key = bar
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            with gdaltest.config_option(
-                "USERPROFILE" if sys.platform == "win32" else "HOME",
-                str(tmpdir),
-                thread_local=False,
-            ):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
+        with gdaltest.config_options(
+            {
+                **options,
+                "USERPROFILE" if sys.platform == "win32" else "HOME": str(tmpdir),
+            },
+            thread_local=False,
+        ):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    assert data == "foo"
+    assert data == b"foo"
 
 
 ###############################################################################
@@ -4404,7 +4611,7 @@ aws_secret_access_key = bar
 
 
 def test_vsis3_read_credentials_config_file_inconsistent(
-    aws_test_config, webserver_port
+    aws_test_config, webserver_port, vsimem_files
 ):
 
     options = {
@@ -4416,35 +4623,11 @@ def test_vsis3_read_credentials_config_file_inconsistent(
 
     gdal.VSICurlClearCache()
 
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_credentials",
-        """
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-[default]
-aws_access_key_id = AWS_ACCESS_KEY_ID
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-""",
-    )
-
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_config",
-        """
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-[default]
-aws_access_key_id = AWS_ACCESS_KEY_ID_inconsistent
-aws_secret_access_key = AWS_SECRET_ACCESS_KEY_inconsistent
-region = us-east-1
-[unrelated]
-aws_access_key_id = foo
-aws_secret_access_key = bar
-""",
+    vsimem_files(
+        {
+            "/vsimem/aws_credentials": AWS_CREDENTIALS_FILE_CONTENT,
+            "/vsimem/aws_config": AWS_CONFIG_FILE_INCONSISTENT_CONTENT,
+        }
     )
 
     gdal.ErrorReset()
@@ -4452,7 +4635,10 @@ aws_secret_access_key = bar
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
@@ -4460,91 +4646,67 @@ aws_secret_access_key = bar
                 f = open_for_read("/vsis3/s3_fake_bucket/resource")
         assert f is not None
         assert gdal.GetLastErrorMsg() != ""
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
+        data = gdal.VSIFReadL(1, 4, f)
         gdal.VSIFCloseL(f)
 
-    assert data == "foo"
-
-    gdal.Unlink("/vsimem/aws_credentials")
-    gdal.Unlink("/vsimem/aws_config")
+    assert data == b"foo"
 
 
 ###############################################################################
 # Read credentials from sts AssumeRoleWithWebIdentity
 @pytest.mark.skipif(sys.platform not in ("linux", "win32"), reason="Incorrect platform")
 def test_vsis3_read_credentials_sts_assume_role_with_web_identity(
-    aws_test_config, webserver_port
+    aws_test_config, webserver_port, webserver_url, vsimem_files
 ):
-    fp = tempfile.NamedTemporaryFile(delete=False)
-    fp.write(b"token")
-    fp.close()
-
-    aws_role_arn = "arn:aws:iam:role/test"
-    aws_role_arn_encoded = urllib.parse.quote_plus(aws_role_arn)
     options = {
         "CPL_AWS_CREDENTIALS_FILE": "",
         "AWS_CONFIG_FILE": "",
         "AWS_SECRET_ACCESS_KEY": "",
         "AWS_ACCESS_KEY_ID": "",
-        "AWS_ROLE_ARN": aws_role_arn,
-        "AWS_WEB_IDENTITY_TOKEN_FILE": fp.name,
+        "AWS_ROLE_ARN": AWS_ROLE_ARN,
+        "AWS_WEB_IDENTITY_TOKEN_FILE": "/vsimem/web_identity_token_file",
     }
 
     gdal.VSICurlClearCache()
 
+    vsimem_files({"/vsimem/web_identity_token_file": b"token"})
+
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
-        f"/?Action=AssumeRoleWithWebIdentity&RoleSessionName=gdal&Version=2011-06-15&RoleArn={aws_role_arn_encoded}&WebIdentityToken=token",
+        f"/?Action=AssumeRoleWithWebIdentity&RoleSessionName=gdal&Version=2011-06-15&RoleArn={AWS_ROLE_ARN_ENCODED}&WebIdentityToken=token",
         200,
         {},
-        """<AssumeRoleWithWebIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
-          <AssumeRoleWithWebIdentityResult>
-            <SubjectFromWebIdentityToken>amzn1.account.AF6RHO7KZU5XRVQJGXK6HB56KR2A</SubjectFromWebIdentityToken>
-            <Audience>client.5498841531868486423.1548@apps.example.com</Audience>
-            <AssumedRoleUser>
-              <Arn>arn:aws:sts::123456789012:assumed-role/FederatedWebIdentityRole/app1</Arn>
-              <AssumedRoleId>AROACLKWSDQRAOEXAMPLE:app1</AssumedRoleId>
-            </AssumedRoleUser>
-            <Credentials>
-              <SessionToken>AWS_SESSION_TOKEN</SessionToken>
-              <SecretAccessKey>AWS_SECRET_ACCESS_KEY</SecretAccessKey>
-              <Expiration>3000-01-01T00:00:00Z</Expiration>
-              <AccessKeyId>AWS_ACCESS_KEY_ID</AccessKeyId>
-            </Credentials>
-            <SourceIdentity>SourceIdentityValue</SourceIdentity>
-            <Provider>www.amazon.com</Provider>
-          </AssumeRoleWithWebIdentityResult>
-          <ResponseMetadata>
-            <RequestId>ad4156e9-bce1-11e2-82e6-6b6efEXAMPLE</RequestId>
-          </ResponseMetadata>
-        </AssumeRoleWithWebIdentityResponse>""",
+        get_assume_role_with_web_identity_response("3000-01-01T00:00:00Z"),
     )
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(
+            webserver_port, session_token="AWS_SESSION_TOKEN"
+        ),
     )
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            with gdaltest.config_option(
-                "CPL_AWS_STS_ROOT_URL",
-                "http://localhost:%d" % webserver_port,
-                thread_local=False,
-            ):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
+        with gdaltest.config_options(
+            {**options, "CPL_AWS_STS_ROOT_URL": webserver_url},
+            thread_local=False,
+        ):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    gdal.Unlink(fp.name)
-    assert data == "foo"
+    assert data == b"foo"
 
 
 ###############################################################################
-# Read credentials from simulated EC2 instance
+# Read credentials from simulated EC2 instance, that supports IMDSv2 or only
+# IMDSv1
 @pytest.mark.skipif(sys.platform not in ("linux", "win32"), reason="Incorrect platform")
-def test_vsis3_read_credentials_ec2_imdsv2(aws_test_config, webserver_port):
+@pytest.mark.parametrize("imds_version", ["imdsv2", "imdsv1"])
+def test_vsis3_read_credentials_ec2(
+    aws_test_config, webserver_port, webserver_url, imds_version
+):
     options = {
         "CPL_AWS_CREDENTIALS_FILE": "",
         "AWS_CONFIG_FILE": "",
@@ -4555,127 +4717,111 @@ def test_vsis3_read_credentials_ec2_imdsv2(aws_test_config, webserver_port):
         "CPL_AWS_WEB_IDENTITY_ENABLE": "NO",
     }
 
+    def add_token_request(handler):
+        if imds_version == "imdsv2":
+            handler.add(
+                "PUT",
+                "/latest/api/token",
+                200,
+                {},
+                "mytoken",
+                expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "21600"},
+            )
+        else:
+            handler.add(
+                "PUT",
+                "/latest/api/token",
+                403,
+                {},
+                expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "21600"},
+            )
+
+    # Metadata requests must be authenticated with the IMDSv2 token, if any
+    if imds_version == "imdsv2":
+        metadata_request_headers = {
+            "expected_headers": {"X-aws-ec2-metadata-token": "mytoken"}
+        }
+    else:
+        metadata_request_headers = {"unexpected_headers": ["X-aws-ec2-metadata-token"]}
+
     gdal.VSICurlClearCache()
 
     handler = webserver.SequentialHandler()
-    handler.add(
-        "PUT",
-        "/latest/api/token",
-        200,
-        {},
-        "mytoken",
-        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "10"},
-    )
+    add_token_request(handler)
     handler.add(
         "GET",
         "/latest/meta-data/iam/security-credentials/",
         200,
         {},
         "myprofile",
-        expected_headers={"X-aws-ec2-metadata-token": "mytoken"},
+        **metadata_request_headers,
     )
     handler.add(
         "GET",
         "/latest/meta-data/iam/security-credentials/myprofile",
         200,
         {},
-        """{
-        "AccessKeyId": "AWS_ACCESS_KEY_ID",
-        "SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
-        "Expiration": "3000-01-01T00:00:00Z"
-        }""",
-        expected_headers={"X-aws-ec2-metadata-token": "mytoken"},
+        EC2_CREDENTIALS_RESPONSE,
+        **metadata_request_headers,
     )
 
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            with gdaltest.config_option(
-                "CPL_AWS_EC2_API_ROOT_URL",
-                "http://localhost:%d" % webserver_port,
-                thread_local=False,
-            ):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
+        with gdaltest.config_options(
+            {**options, "CPL_AWS_EC2_API_ROOT_URL": webserver_url},
+            thread_local=False,
+        ):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    assert data == "foo"
+    assert data == b"foo"
 
-    handler = webserver.SequentialHandler()
+    handler.reset()
     handler.add("GET", "/s3_fake_bucket/bar", 200, {}, "bar")
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            # Set a fake URL to check that credentials re-use works
-            with gdaltest.config_option(
-                "CPL_AWS_EC2_API_ROOT_URL", "", thread_local=False
-            ):
-                f = open_for_read("/vsis3/s3_fake_bucket/bar")
+        # Set a fake URL to check that credentials re-use works
+        with gdaltest.config_options(
+            {**options, "CPL_AWS_EC2_API_ROOT_URL": ""}, thread_local=False
+        ):
+            f = open_for_read("/vsis3/s3_fake_bucket/bar")
         assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
+        assert gdal.VSIFReadL(1, 4, f) == b"bar"
         gdal.VSIFCloseL(f)
 
-    assert data == "bar"
-
     # We can reuse credentials here as their expiration is far away in the future
     with gdaltest.config_options(
-        {**options, "CPL_AWS_EC2_API_ROOT_URL": "http://localhost:%d" % webserver_port},
+        {**options, "CPL_AWS_EC2_API_ROOT_URL": webserver_url},
         thread_local=False,
     ):
         signed_url = gdal.GetSignedURL("/vsis3/s3_fake_bucket/resource")
-    expected_url_8080 = (
-        "http://127.0.0.1:8080/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
-        "&X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z&X-Amz-Expires=3600"
-        "&X-Amz-Signature="
-        "dca239dd95f72ff8c37c15c840afc54cd19bdb07f7aaee2223108b5b0ad35da8"
-        "&X-Amz-SignedHeaders=host"
-    )
-    expected_url_8081 = (
-        "http://127.0.0.1:8081/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
-        "&X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z&X-Amz-Expires=3600"
-        "&X-Amz-Signature="
-        "ef5216bc5971863414c69f6ca095276c0d62c0da97fa4f6ab80c30bd7fc146ac"
-        "&X-Amz-SignedHeaders=host"
-    )
-    assert signed_url in (expected_url_8080, expected_url_8081)
+    assert signed_url == get_aws_sign4_presigned_url(
+        "127.0.0.1:%d" % webserver_port, "/s3_fake_bucket/resource"
+    )
 
     # Now test asking for an expiration in a super long delay, which will
-    # cause credentials to be queried again
-    handler = webserver.SequentialHandler()
-    handler.add(
-        "PUT",
-        "/latest/api/token",
-        200,
-        {},
-        "mytoken2",
-        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "10"},
-    )
+    # cause credentials to be queried again. An IMDSv2 token is still valid,
+    # so it is reused, whereas with IMDSv1 the token request is attempted
+    # again.
+    handler.reset()
+    if imds_version == "imdsv1":
+        add_token_request(handler)
     handler.add(
         "GET",
         "/latest/meta-data/iam/security-credentials/myprofile",
         200,
         {},
-        """{
-        "AccessKeyId": "AWS_ACCESS_KEY_ID",
-        "SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
-        "Token": "AWS_SESSION_TOKEN",
-        "Expiration": "5000-01-01T00:00:00Z"
-        }""",
-        expected_headers={"X-aws-ec2-metadata-token": "mytoken2"},
+        EC2_CREDENTIALS_WITH_SESSION_TOKEN_RESPONSE,
+        **metadata_request_headers,
     )
 
     with gdaltest.config_options(
-        {**options, "CPL_AWS_EC2_API_ROOT_URL": "http://localhost:%d" % webserver_port},
+        {**options, "CPL_AWS_EC2_API_ROOT_URL": webserver_url},
         thread_local=False,
     ):
         with webserver.install_http_handler(handler):
@@ -4683,98 +4829,21 @@ def test_vsis3_read_credentials_ec2_imdsv2(aws_test_config, webserver_port):
                 "/vsis3/s3_fake_bucket/resource",
                 ["EXPIRATION_DELAY=" + str(2000 * 365 * 86400)],
             )
-    expected_url_8080 = (
-        "http://127.0.0.1:8080/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256&"
-        "X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z"
-        "&X-Amz-Expires=63072000000"
-        "&X-Amz-Security-Token=AWS_SESSION_TOKEN"
-        "&X-Amz-Signature="
-        "42770a74a5ad96940a42d5660959d36bb027d3ec8433d66d1b003983ef9f47c9"
-        "&X-Amz-SignedHeaders=host"
-    )
-    expected_url_8081 = (
-        "http://127.0.0.1:8081/s3_fake_bucket/resource"
-        "?X-Amz-Algorithm=AWS4-HMAC-SHA256&"
-        "X-Amz-Credential="
-        "AWS_ACCESS_KEY_ID%2F20150101%2Fus-east-1%2Fs3%2Faws4_request"
-        "&X-Amz-Date=20150101T000000Z"
-        "&X-Amz-Expires=63072000000"
-        "&X-Amz-Security-Token=AWS_SESSION_TOKEN"
-        "&X-Amz-Signature="
-        "20e35d2707bd2e2896879dc009f5327d4dfd43500e16bb1c6e157dd5eda4403f"
-        "&X-Amz-SignedHeaders=host"
-    )
-    assert signed_url in (expected_url_8080, expected_url_8081), signed_url
-
-
-###############################################################################
-# Read credentials from simulated EC2 instance that only supports IMDSv1
-@pytest.mark.skipif(sys.platform not in ("linux", "win32"), reason="Incorrect platform")
-def test_vsis3_read_credentials_ec2_imdsv1(aws_test_config, webserver_port):
-    options = {
-        "CPL_AWS_CREDENTIALS_FILE": "",
-        "AWS_CONFIG_FILE": "",
-        "AWS_SECRET_ACCESS_KEY": "",
-        "AWS_ACCESS_KEY_ID": "",
-        "CPL_AWS_EC2_API_ROOT_URL": "http://localhost:%d" % webserver_port,
-        # Disable hypervisor related check to test if we are really on EC2
-        "CPL_AWS_AUTODETECT_EC2": "NO",
-    }
-
-    gdal.VSICurlClearCache()
-
-    handler = webserver.SequentialHandler()
-    handler.add(
-        "PUT",
-        "/latest/api/token",
-        403,
-        {},
-        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "10"},
-    )
-    handler.add(
-        "GET",
-        "/latest/meta-data/iam/security-credentials/",
-        200,
-        {},
-        "myprofile",
-        unexpected_headers=["X-aws-ec2-metadata-token"],
-    )
-    handler.add(
-        "GET",
-        "/latest/meta-data/iam/security-credentials/myprofile",
-        200,
-        {},
-        """{
-        "AccessKeyId": "AWS_ACCESS_KEY_ID",
-        "SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
-        "Expiration": "3000-01-01T00:00:00Z"
-        }""",
-        unexpected_headers=["X-aws-ec2-metadata-token"],
-    )
-
-    handler.add(
-        "GET",
+    assert signed_url == get_aws_sign4_presigned_url(
+        "127.0.0.1:%d" % webserver_port,
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
-    )
-    with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
-
-    assert data == "foo"
+        expires="63072000000",
+        session_token="AWS_SESSION_TOKEN",
+    ), signed_url
 
 
 ###############################################################################
 # Read credentials from simulated EC2 instance with expiration of the
 # cached credentials
 @pytest.mark.skipif(sys.platform not in ("linux", "win32"), reason="Incorrect platform")
-def test_vsis3_read_credentials_ec2_expiration(aws_test_config, webserver_port):
+def test_vsis3_read_credentials_ec2_expiration(
+    aws_test_config, webserver_port, webserver_url
+):
 
     options = {
         "CPL_AWS_CREDENTIALS_FILE": "",
@@ -4785,9 +4854,6 @@ def test_vsis3_read_credentials_ec2_expiration(aws_test_config, webserver_port):
         "CPL_AWS_AUTODETECT_EC2": "NO",
     }
 
-    valid_url = "http://localhost:%d" % webserver_port
-    invalid_url = "http://localhost:%d/invalid" % webserver_port
-
     gdal.VSICurlClearCache()
 
     handler = webserver.SequentialHandler()
@@ -4797,7 +4863,7 @@ def test_vsis3_read_credentials_ec2_expiration(aws_test_config, webserver_port):
         200,
         {},
         "mytoken",
-        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "10"},
+        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "21600"},
     )
     handler.add(
         "GET",
@@ -4812,63 +4878,48 @@ def test_vsis3_read_credentials_ec2_expiration(aws_test_config, webserver_port):
         "/latest/meta-data/iam/security-credentials/myprofile",
         200,
         {},
-        """{
-        "AccessKeyId": "AWS_ACCESS_KEY_ID",
-        "SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
-        "Expiration": "1970-01-01T00:00:00Z"
-        }""",
+        EC2_EXPIRED_CREDENTIALS_RESPONSE,
         expected_headers={"X-aws-ec2-metadata-token": "mytoken"},
     )
-    handler.add(
-        "PUT",
-        "/latest/api/token",
-        200,
-        {},
-        "mytoken2",
-        expected_headers={"X-aws-ec2-metadata-token-ttl-seconds": "10"},
-    )
+    # The IMDSv2 token is still valid, so it is reused to refresh the
+    # expired credentials
     handler.add(
         "GET",
         "/latest/meta-data/iam/security-credentials/myprofile",
         200,
         {},
-        """{
-        "AccessKeyId": "AWS_ACCESS_KEY_ID",
-        "SecretAccessKey": "AWS_SECRET_ACCESS_KEY",
-        "Expiration": "1970-01-01T00:00:00Z"
-        }""",
-        expected_headers={"X-aws-ec2-metadata-token": "mytoken2"},
+        EC2_EXPIRED_CREDENTIALS_RESPONSE,
+        expected_headers={"X-aws-ec2-metadata-token": "mytoken"},
     )
     handler.add(
         "GET",
         "/s3_fake_bucket/resource",
-        custom_method=get_s3_fake_bucket_resource_method,
+        200,
+        {},
+        "foo",
+        expected_headers=get_s3_fake_bucket_resource_expected_headers(webserver_port),
     )
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            with gdaltest.config_option(
-                "CPL_AWS_EC2_API_ROOT_URL", valid_url, thread_local=False
-            ):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource")
-                assert f is not None
-                data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-                gdal.VSIFCloseL(f)
+        with gdaltest.config_options(
+            {**options, "CPL_AWS_EC2_API_ROOT_URL": webserver_url}, thread_local=False
+        ):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
 
-    assert data == "foo"
+    assert data == b"foo"
 
-    handler = webserver.SequentialHandler()
+    handler.reset()
     handler.add("PUT", "/invalid/latest/api/token", 404)
     handler.add(
         "GET", "/invalid/latest/meta-data/iam/security-credentials/myprofile", 404
     )
     with webserver.install_http_handler(handler):
-        with gdaltest.config_options(options, thread_local=False):
-            # Set a fake URL to demonstrate we try to re-fetch credentials
-            with gdaltest.config_option(
-                "CPL_AWS_EC2_API_ROOT_URL", invalid_url, thread_local=False
-            ):
-                with gdaltest.error_handler():
-                    f = open_for_read("/vsis3/s3_fake_bucket/bar")
+        # Set a fake URL to demonstrate we try to re-fetch credentials
+        with gdaltest.config_options(
+            {**options, "CPL_AWS_EC2_API_ROOT_URL": webserver_url + "/invalid"},
+            thread_local=False,
+        ):
+            with gdaltest.error_handler():
+                f = open_for_read("/vsis3/s3_fake_bucket/bar")
         assert f is None
 
 
@@ -4876,71 +4927,74 @@ def test_vsis3_read_credentials_ec2_expiration(aws_test_config, webserver_port):
 # Read credentials from an assumed role
 
 
-def test_vsis3_read_credentials_assumed_role(aws_test_config, webserver_port):
-    if webserver_port != 8080:
-        pytest.skip("Expected results coded from webserver port = 8080")
-
+def test_vsis3_read_credentials_assumed_role(
+    aws_test_config, webserver_port, webserver_host, vsimem_files
+):
     options = {
         "AWS_SECRET_ACCESS_KEY": "",
         "AWS_ACCESS_KEY_ID": "",
         "CPL_AWS_CREDENTIALS_FILE": "/vsimem/aws_credentials",
         "AWS_CONFIG_FILE": "/vsimem/aws_config",
         "AWS_PROFILE": "my_profile",
-        "AWS_STS_ENDPOINT": "localhost:%d" % webserver_port,
+        "AWS_STS_ENDPOINT": webserver_host,
     }
 
     gdal.VSICurlClearCache()
 
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_credentials",
-        """
+    vsimem_files(
+        {
+            "/vsimem/aws_credentials": """
 [foo]
 aws_access_key_id = AWS_ACCESS_KEY_ID
 aws_secret_access_key = AWS_SECRET_ACCESS_KEY
 """,
-    )
-
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_config",
-        """
+            "/vsimem/aws_config": f"""
 [profile my_profile]
-role_arn = arn:aws:iam::557268267719:role/role
+role_arn = {ASSUMED_ROLE_ARN}
 source_profile = foo
 # below are optional
 external_id = my_external_id
 mfa_serial = my_mfa_serial
 role_session_name = my_role_session_name
 """,
+        }
     )
 
-    expired_xml_response = """
-        <AssumeRoleResponse><AssumeRoleResult><Credentials>
-            <AccessKeyId>TEMP_ACCESS_KEY_ID</AccessKeyId>
-            <SecretAccessKey>TEMP_SECRET_ACCESS_KEY</SecretAccessKey>
-            <SessionToken>TEMP_SESSION_TOKEN</SessionToken>
-            <Expiration>1970-01-01T01:00:00Z</Expiration>
-        </Credentials></AssumeRoleResult></AssumeRoleResponse>"""
+    assume_role_query = (
+        "Action=AssumeRole&ExternalId=my_external_id"
+        f"&RoleArn={ASSUMED_ROLE_ARN_ENCODED}"
+        "&RoleSessionName=my_role_session_name&SerialNumber=my_mfa_serial"
+        "&Version=2011-06-15"
+    )
+    expected_sts_authorization = get_aws_sign4_authorization(
+        "AWS_ACCESS_KEY_ID",
+        "AWS_SECRET_ACCESS_KEY",
+        webserver_host,
+        "/",
+        assume_role_query,
+        service="sts",
+    )
 
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
-        "/?Action=AssumeRole&ExternalId=my_external_id&RoleArn=arn%3Aaws%3Aiam%3A%3A557268267719%3Arole%2Frole&RoleSessionName=my_role_session_name&SerialNumber=my_mfa_serial&Version=2011-06-15",
+        "/?" + assume_role_query,
         200,
         {},
-        expired_xml_response,
+        ASSUME_ROLE_EXPIRED_RESPONSE,
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/sts/aws4_request,SignedHeaders=host,Signature=3dd83fa260ec68bb50814f7fceb0ad79712de94a1ee0b285d13a8069e0a16ab4",
+            "Authorization": expected_sts_authorization,
             "X-Amz-Date": "20150101T000000Z",
         },
     )
     handler.add(
         "GET",
-        "/?Action=AssumeRole&ExternalId=my_external_id&RoleArn=arn%3Aaws%3Aiam%3A%3A557268267719%3Arole%2Frole&RoleSessionName=my_role_session_name&SerialNumber=my_mfa_serial&Version=2011-06-15",
+        "/?" + assume_role_query,
         200,
         {},
-        expired_xml_response,
+        ASSUME_ROLE_EXPIRED_RESPONSE,
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=AWS_ACCESS_KEY_ID/20150101/us-east-1/sts/aws4_request,SignedHeaders=host,Signature=3dd83fa260ec68bb50814f7fceb0ad79712de94a1ee0b285d13a8069e0a16ab4",
+            "Authorization": expected_sts_authorization,
             "X-Amz-Date": "20150101T000000Z",
         },
     )
@@ -4951,34 +5005,29 @@ role_session_name = my_role_session_name
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=d5e8167e066e7439e0e57a43e1167f9ee7efe4b451c72de1a3a150f6fc033403",
+            "Authorization": get_aws_sign4_authorization(
+                "TEMP_ACCESS_KEY_ID",
+                "TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource",
+                session_token="TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "TEMP_SESSION_TOKEN",
         },
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource")
-            assert f is not None
-            data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
-    assert data == "foo"
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
+    assert data == b"foo"
 
     # Get another resource and check that we renew the expired temporary credentials
-    non_expired_xml_response = """
-        <AssumeRoleResponse><AssumeRoleResult><Credentials>
-            <AccessKeyId>ANOTHER_TEMP_ACCESS_KEY_ID</AccessKeyId>
-            <SecretAccessKey>ANOTHER_TEMP_SECRET_ACCESS_KEY</SecretAccessKey>
-            <SessionToken>ANOTHER_TEMP_SESSION_TOKEN</SessionToken>
-            <Expiration>3000-01-01T01:00:00Z</Expiration>
-        </Credentials></AssumeRoleResult></AssumeRoleResponse>"""
-
-    handler = webserver.SequentialHandler()
+    handler.reset()
     handler.add(
         "GET",
-        "/?Action=AssumeRole&ExternalId=my_external_id&RoleArn=arn%3Aaws%3Aiam%3A%3A557268267719%3Arole%2Frole&RoleSessionName=my_role_session_name&SerialNumber=my_mfa_serial&Version=2011-06-15",
+        "/?" + assume_role_query,
         200,
         {},
-        non_expired_xml_response,
+        ASSUME_ROLE_ANOTHER_NON_EXPIRED_RESPONSE,
     )
     handler.add(
         "GET",
@@ -4987,20 +5036,23 @@ role_session_name = my_role_session_name
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=ANOTHER_TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=9716b5928ed350263c9492159dccbdc9aac321cfea383d7f67bd8b4c7ca33463",
+            "Authorization": get_aws_sign4_authorization(
+                "ANOTHER_TEMP_ACCESS_KEY_ID",
+                "ANOTHER_TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource2",
+                session_token="ANOTHER_TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "ANOTHER_TEMP_SESSION_TOKEN",
         },
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource2")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
-    assert data == "foo"
+            data = read_and_close("/vsis3/s3_fake_bucket/resource2")
+    assert data == b"foo"
 
     # Get another resource and check that we reuse the still valid temporary credentials
-    handler = webserver.SequentialHandler()
+    handler.reset()
     handler.add(
         "GET",
         "/s3_fake_bucket/resource3",
@@ -5008,26 +5060,40 @@ role_session_name = my_role_session_name
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=ANOTHER_TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=27e28bd4dad95495b851b54ff875b8ebcec6e0f6f5e4adf045153bd0d7958fbb",
+            "Authorization": get_aws_sign4_authorization(
+                "ANOTHER_TEMP_ACCESS_KEY_ID",
+                "ANOTHER_TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource3",
+                session_token="ANOTHER_TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "ANOTHER_TEMP_SESSION_TOKEN",
         },
     )
     with webserver.install_http_handler(handler):
         with gdaltest.config_options(options, thread_local=False):
-            f = open_for_read("/vsis3/s3_fake_bucket/resource3")
-        assert f is not None
-        data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-        gdal.VSIFCloseL(f)
-    assert data == "foo"
+            data = read_and_close("/vsis3/s3_fake_bucket/resource3")
+    assert data == b"foo"
 
-    gdal.Unlink("/vsimem/aws_credentials")
-    gdal.Unlink("/vsimem/aws_config")
+    # Check that GetSignedURL() also uses the still valid temporary
+    # credentials, without any request
+    handler.reset()
+    with webserver.install_http_handler(handler):
+        with gdaltest.config_options(options, thread_local=False):
+            signed_url = gdal.GetSignedURL("/vsis3/s3_fake_bucket/resource3")
+    assert signed_url == get_aws_sign4_presigned_url(
+        "127.0.0.1:%d" % webserver_port,
+        "/s3_fake_bucket/resource3",
+        session_token="ANOTHER_TEMP_SESSION_TOKEN",
+        access_key_id="ANOTHER_TEMP_ACCESS_KEY_ID",
+        secret_access_key="ANOTHER_TEMP_SECRET_ACCESS_KEY",
+    ), signed_url
 
 
 ###############################################################################
 # Read credentials from sts AssumeRoleWithWebIdentity
 def test_vsis3_read_credentials_sts_assume_role_with_web_identity_from_config_file(
-    aws_test_config, webserver_port
+    aws_test_config, webserver_port, webserver_host, webserver_url, vsimem_files
 ):
     options = {
         "AWS_SECRET_ACCESS_KEY": "",
@@ -5035,19 +5101,17 @@ def test_vsis3_read_credentials_sts_assume_role_with_web_identity_from_config_fi
         "CPL_AWS_CREDENTIALS_FILE": "/vsimem/aws_credentials",
         "AWS_CONFIG_FILE": "/vsimem/aws_config",
         "AWS_PROFILE": "my_profile",
-        "AWS_STS_ENDPOINT": "localhost:%d" % webserver_port,
-        "CPL_AWS_STS_ROOT_URL": "http://localhost:%d" % webserver_port,
+        "AWS_STS_ENDPOINT": webserver_host,
+        "CPL_AWS_STS_ROOT_URL": webserver_url,
     }
 
     gdal.VSICurlClearCache()
 
-    gdal.FileFromMemBuffer("/vsimem/web_identity_token_file", "token\n")
-
-    gdal.FileFromMemBuffer("/vsimem/aws_credentials", "")
-
-    gdal.FileFromMemBuffer(
-        "/vsimem/aws_config",
-        """
+    vsimem_files(
+        {
+            "/vsimem/web_identity_token_file": "token\n",
+            "/vsimem/aws_credentials": "",
+            "/vsimem/aws_config": """
 [profile foo]
 role_arn = foo_role_arn
 web_identity_token_file = /vsimem/web_identity_token_file
@@ -5055,39 +5119,16 @@ web_identity_token_file = /vsimem/web_identity_token_file
 role_arn = my_profile_role_arn
 source_profile = foo
 """,
+        }
     )
 
-    gdal.VSICurlClearCache()
-
-    assumeRoleWithWebIdentityResponseXML = """<AssumeRoleWithWebIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
-          <AssumeRoleWithWebIdentityResult>
-            <SubjectFromWebIdentityToken>amzn1.account.AF6RHO7KZU5XRVQJGXK6HB56KR2A</SubjectFromWebIdentityToken>
-            <Audience>client.5498841531868486423.1548@apps.example.com</Audience>
-            <AssumedRoleUser>
-              <Arn>arn:aws:sts::123456789012:assumed-role/FederatedWebIdentityRole/app1</Arn>
-              <AssumedRoleId>AROACLKWSDQRAOEXAMPLE:app1</AssumedRoleId>
-            </AssumedRoleUser>
-            <Credentials>
-              <SessionToken>AWS_SESSION_TOKEN</SessionToken>
-              <SecretAccessKey>AWS_SECRET_ACCESS_KEY</SecretAccessKey>
-              <Expiration>9999-01-01T00:00:00Z</Expiration>
-              <AccessKeyId>AWS_ACCESS_KEY_ID</AccessKeyId>
-            </Credentials>
-            <SourceIdentity>SourceIdentityValue</SourceIdentity>
-            <Provider>www.amazon.com</Provider>
-          </AssumeRoleWithWebIdentityResult>
-          <ResponseMetadata>
-            <RequestId>ad4156e9-bce1-11e2-82e6-6b6efEXAMPLE</RequestId>
-          </ResponseMetadata>
-        </AssumeRoleWithWebIdentityResponse>"""
-
     handler = webserver.SequentialHandler()
     handler.add(
         "GET",
         "/?Action=AssumeRoleWithWebIdentity&RoleSessionName=gdal&Version=2011-06-15&RoleArn=foo_role_arn&WebIdentityToken=token",
         200,
         {},
-        assumeRoleWithWebIdentityResponseXML,
+        get_assume_role_with_web_identity_response("9999-01-01T00:00:00Z"),
     )
 
     # Note that the Expiration is in the past, so for a next request we will
@@ -5097,12 +5138,7 @@ source_profile = foo
         "/?Action=AssumeRole&RoleArn=my_profile_role_arn&RoleSessionName=GDAL-session&Version=2011-06-15",
         200,
         {},
-        """<AssumeRoleResponse><AssumeRoleResult><Credentials>
-            <AccessKeyId>TEMP_ACCESS_KEY_ID</AccessKeyId>
-            <SecretAccessKey>TEMP_SECRET_ACCESS_KEY</SecretAccessKey>
-            <SessionToken>TEMP_SESSION_TOKEN</SessionToken>
-            <Expiration>1970-01-01T01:00:00Z</Expiration>
-        </Credentials></AssumeRoleResult></AssumeRoleResponse>""",
+        ASSUME_ROLE_EXPIRED_RESPONSE,
     )
 
     handler.add(
@@ -5112,7 +5148,13 @@ source_profile = foo
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=d5e8167e066e7439e0e57a43e1167f9ee7efe4b451c72de1a3a150f6fc033403",
+            "Authorization": get_aws_sign4_authorization(
+                "TEMP_ACCESS_KEY_ID",
+                "TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource",
+                session_token="TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "TEMP_SESSION_TOKEN",
         },
     )
@@ -5123,7 +5165,7 @@ source_profile = foo
         "/?Action=AssumeRoleWithWebIdentity&RoleSessionName=gdal&Version=2011-06-15&RoleArn=foo_role_arn&WebIdentityToken=token",
         200,
         {},
-        assumeRoleWithWebIdentityResponseXML,
+        get_assume_role_with_web_identity_response("9999-01-01T00:00:00Z"),
     )
 
     handler2.add(
@@ -5131,12 +5173,7 @@ source_profile = foo
         "/?Action=AssumeRole&RoleArn=my_profile_role_arn&RoleSessionName=GDAL-session&Version=2011-06-15",
         200,
         {},
-        """<AssumeRoleResponse><AssumeRoleResult><Credentials>
-            <AccessKeyId>TEMP_ACCESS_KEY_ID</AccessKeyId>
-            <SecretAccessKey>TEMP_SECRET_ACCESS_KEY</SecretAccessKey>
-            <SessionToken>TEMP_SESSION_TOKEN</SessionToken>
-            <Expiration>9999-01-01T01:00:00Z</Expiration>
-        </Credentials></AssumeRoleResult></AssumeRoleResponse>""",
+        ASSUME_ROLE_NON_EXPIRED_RESPONSE,
     )
 
     handler2.add(
@@ -5146,7 +5183,13 @@ source_profile = foo
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=d5abb4e09ad29ad3810cfe21702e7e2e9071798c441acaed9613d62ed8600556",
+            "Authorization": get_aws_sign4_authorization(
+                "TEMP_ACCESS_KEY_ID",
+                "TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource2",
+                session_token="TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "TEMP_SESSION_TOKEN",
         },
     )
@@ -5158,38 +5201,29 @@ source_profile = foo
         {},
         "foo",
         expected_headers={
-            "Authorization": "AWS4-HMAC-SHA256 Credential=TEMP_ACCESS_KEY_ID/20150101/us-east-1/s3/aws4_request,SignedHeaders=host;x-amz-content-sha256;x-amz-date;x-amz-security-token,Signature=a158ddb8b5fd40fd5226c0ca28c14620863b8157c870e7e96ff841662aaef79a",
+            "Authorization": get_aws_sign4_authorization(
+                "TEMP_ACCESS_KEY_ID",
+                "TEMP_SECRET_ACCESS_KEY",
+                "127.0.0.1:%d" % webserver_port,
+                "/s3_fake_bucket/resource3",
+                session_token="TEMP_SESSION_TOKEN",
+            ),
             "X-Amz-Security-Token": "TEMP_SESSION_TOKEN",
         },
     )
 
-    try:
-        with webserver.install_http_handler(handler):
-            with gdaltest.config_options(options, thread_local=False):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource")
-            assert f is not None
-            data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-            gdal.VSIFCloseL(f)
-        assert data == "foo"
-
-        with webserver.install_http_handler(handler2):
-            with gdaltest.config_options(options, thread_local=False):
-                f = open_for_read("/vsis3/s3_fake_bucket/resource2")
-                assert f is not None
-                data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-                gdal.VSIFCloseL(f)
-                assert data == "foo"
+    with webserver.install_http_handler(handler):
+        with gdaltest.config_options(options, thread_local=False):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource")
+    assert data == b"foo"
 
-                f = open_for_read("/vsis3/s3_fake_bucket/resource3")
-                assert f is not None
-                data = gdal.VSIFReadL(1, 4, f).decode("ascii")
-                gdal.VSIFCloseL(f)
-                assert data == "foo"
+    with webserver.install_http_handler(handler2):
+        with gdaltest.config_options(options, thread_local=False):
+            data = read_and_close("/vsis3/s3_fake_bucket/resource2")
+            assert data == b"foo"
 
-    finally:
-        gdal.Unlink("/vsimem/web_identity_token_file")
-        gdal.Unlink("/vsimem/aws_credentials")
-        gdal.Unlink("/vsimem/aws_config")
+            data = read_and_close("/vsis3/s3_fake_bucket/resource3")
+            assert data == b"foo"
 
 
 ###############################################################################
@@ -5356,18 +5390,23 @@ def test_vsis3_extra_1():
             local_file = "tmp/gdal_sync_test.bin"
             remote_file = path + "/gdal_sync_test.bin"
 
+            # Download in parallel ranged requests. (Parallel multipart upload
+            # only kicks in for chunks of at least 8 MB, so it does not apply
+            # to the small files of this test)
+            download_options = ["NUM_THREADS=8", "CHUNK_SIZE=16384"]
+
             f = gdal.VSIFOpenL(local_file, "wb")
-            gdal.VSIFWriteL("foo" * 10000, 1, 3 * 10000, f)
+            gdal.VSIFWriteL(b"foo" * 10000, 1, 3 * 10000, f)
             gdal.VSIFCloseL(f)
 
             gdal.Sync(local_file, remote_file)
             gdal.Unlink(local_file)
-            gdal.Sync(remote_file, local_file)
+            gdal.Sync(remote_file, local_file, options=download_options)
 
             assert gdal.VSIStatL(local_file).size == 3 * 10000
 
             f = gdal.VSIFOpenL(local_file, "wb")
-            gdal.VSIFWriteL("foobar" * 10000, 1, 6 * 10000, f)
+            gdal.VSIFWriteL(b"foobar" * 10000, 1, 6 * 10000, f)
             gdal.VSIFCloseL(f)
 
             gdal.Sync(local_file, remote_file)
@@ -5378,7 +5417,7 @@ def test_vsis3_extra_1():
             assert s == 6 * 10000
 
             gdal.Unlink(local_file)
-            gdal.Sync(remote_file, local_file)
+            gdal.Sync(remote_file, local_file, options=download_options)
 
             assert gdal.VSIStatL(local_file).size == 6 * 10000
 
@@ -203,38 +203,29 @@ def test_hdf5_8():
         "attribute with spaces_and_underscores": 0.1,
     }
 
-    def scanMetadata(parts):
-        for attr in attributes:
-            name = "_".join(parts + [attr])
-            name = name.replace(" ", "_")
-            assert name in metadata, 'unable to find metadata: "%s"' % name
-
-            value = metadata.pop(name)
-
-            value = value.strip(" d")
-            value = type(attributes[attr])(value)
-            assert (
-                value == attributes[attr]
-            ), 'incorrect metadata value for "%s": ' '"%s" != "%s"' % (
-                name,
-                value,
-                attributes[attr],
-            )
-
-    # level0
-    assert scanMetadata([]) is None
-
-    # level1 datasets
-    for h5dataset in h5datasets:
-        assert scanMetadata([h5dataset]) is None
-
-    # level1 groups
-    for h5group in h5groups:
-        assert scanMetadata([h5group]) is None
-
-        # level2 datasets
-        for h5dataset in h5datasets:
-            assert scanMetadata([h5group, h5dataset]) is None
+    expected = {}
+    for parts in (
+        [[]]
+        + [[h5dataset] for h5dataset in h5datasets]
+        + [[h5group] for h5group in h5groups]
+        + [[h5group, h5dataset] for h5group in h5groups for h5dataset in h5datasets]
+    ):
+        for attr, attr_value in attributes.items():
+            name = "_".join(parts + [attr]).replace(" ", "_")
+            expected[name] = attr_value
+
+    missing = expected.keys() - metadata.keys()
+    assert not missing, "unable to find metadata: %s" % sorted(missing)
+
+    for name, expected_value in expected.items():
+        value = type(expected_value)(metadata[name].strip(" d"))
+        assert (
+            value == expected_value
+        ), 'incorrect metadata value for "%s": "%s" != "%s"' % (
+            name,
+            value,
+            expected_value,
+        )
 
 
 ###############################################################################
@@ -576,9 +567,8 @@ def test_hdf5_single_dim():
 def test_hdf5_signature_not_at_beginning():
 
     filename = "/vsimem/test.h5"
-    gdal.FileFromMemBuffer(
-        filename, open("data/netcdf/byte_hdf5_starting_at_offset_1024.nc", "rb").read()
-    )
+    with open("data/netcdf/byte_hdf5_starting_at_offset_1024.nc", "rb") as f:
+        gdal.FileFromMemBuffer(filename, f.read())
     ds = gdal.Open(filename)
     assert ds is not None
     gdal.Unlink(filename)
@@ -629,11 +619,5 @@ def test_hdf5_eos_sinu_projection():
         ds.GetSpatialRef().ExportToProj4()
         == "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs"
     )
-    import struct
-
-    assert list(
-        struct.unpack(
-            "B" * (5 * 4 * 3), ds.ReadRaster(buf_pixel_space=3, buf_band_space=1)
-        )
-    ) == [i for i in range(5 * 4 * 3)]
+    assert ds.ReadRaster(buf_pixel_space=3, buf_band_space=1) == bytes(range(5 * 4 * 3))
     ds = None
@@ -35,6 +35,8 @@ import pytest
 
 from osgeo import gdal, ogr, osr
 
+pytestmark = pytest.mark.require_driver("PCIDSK")
+
 wkts = [
     ("POINT (0 1 2)", "points", 0),
     ("LINESTRING (0 1 2,3 4 5)", "lines", 0),
@@ -42,17 +44,30 @@ wkts = [
     ("LINESTRING (0 1 2,3 4 5)", "lines2", 32631),
 ]
 
+###############################################################################
+# Path of the file created by test_ogr_pcidsk_1() and read back by the tests
+# below
+
+
+@pytest.fixture(scope="module")
+def ogr_pcidsk_1_pix():
+
+    filename = "tmp/ogr_pcidsk_1.pix"
+    try:
+        yield filename
+    finally:
+        gdal.Unlink(filename)
+
+
 ###############################################################################
 # Test creation
 
 
-def test_ogr_pcidsk_1():
+def test_ogr_pcidsk_1(ogr_pcidsk_1_pix):
 
     ogr_drv = ogr.GetDriverByName("PCIDSK")
-    if ogr_drv is None:
-        pytest.skip()
 
-    ds = ogr_drv.CreateDataSource("tmp/ogr_pcidsk_1.pix")
+    ds = ogr_drv.CreateDataSource(ogr_pcidsk_1_pix)
 
     lyr = ds.CreateLayer("nothing", geom_type=ogr.wkbNone)
     feat = ogr.Feature(lyr.GetLayerDefn())
@@ -107,9 +122,7 @@ def test_ogr_pcidsk_1():
         lyr.ResetReading()
         feat = lyr.GetNextFeature()
         assert feat is not None, layername
-        if feat.GetGeometryRef().ExportToWkt() != wkt:
-            feat.DumpReadable()
-            pytest.fail(layername)
+        assert feat.GetGeometryRef().ExportToWkt() == wkt, layername
 
     ds = None
 
@@ -118,13 +131,9 @@ def test_ogr_pcidsk_1():
 # Test reading
 
 
-def test_ogr_pcidsk_2():
-
-    ogr_drv = ogr.GetDriverByName("PCIDSK")
-    if ogr_drv is None:
-        pytest.skip()
+def test_ogr_pcidsk_2(ogr_pcidsk_1_pix):
 
-    ds = ogr.Open("tmp/ogr_pcidsk_1.pix")
+    ds = ogr.Open(ogr_pcidsk_1_pix)
     assert ds.GetLayerCount() == 2 + len(wkts)
 
     lyr = ds.GetLayerByName("nothing")
@@ -152,9 +161,7 @@ def test_ogr_pcidsk_2():
 
         feat = lyr.GetNextFeature()
         assert feat is not None, layername
-        if feat.GetGeometryRef().ExportToWkt() != wkt:
-            feat.DumpReadable()
-            pytest.fail(layername)
+        assert feat.GetGeometryRef().ExportToWkt() == wkt, layername
 
     ds = None
 
@@ -163,21 +170,18 @@ def test_ogr_pcidsk_2():
 # Check with test_ogrsf
 
 
-def test_ogr_pcidsk_3():
+def test_ogr_pcidsk_3(ogr_pcidsk_1_pix):
 
     import test_cli_utilities
 
     if test_cli_utilities.get_test_ogrsf_path() is None:
         pytest.skip()
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
     ret = gdaltest.runexternal(
-        test_cli_utilities.get_test_ogrsf_path() + " tmp/ogr_pcidsk_1.pix"
+        test_cli_utilities.get_test_ogrsf_path() + " " + ogr_pcidsk_1_pix
     )
 
-    if ret.find("ERROR: The feature was not deleted") != -1:
+    if "ERROR: The feature was not deleted" in ret:
         # Expected fail for now
         print("ERROR: The feature was not deleted")
         ret = ret.replace(
@@ -199,12 +203,6 @@ def test_ogr_pcidsk_3():
 
 def test_ogr_pcidsk_4():
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
-    if gdal.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
     ds = ogr.Open("../gdrivers/data/utm.pix")
     assert ds is None
     ds = None
@@ -216,12 +214,6 @@ def test_ogr_pcidsk_4():
 
 def test_ogr_pcidsk_5():
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
-    if gdal.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
     ds = ogr.Open("../gdrivers/data/pcidsk/utm.pix", update=1)
     assert ds is not None
     ds = None
@@ -232,26 +224,24 @@ def test_ogr_pcidsk_5():
 
 def test_ogr_pcidsk_add_field_to_non_empty_layer():
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
-    tmpfile = "/vsimem/tmp.pix"
+    tmpfile = "/vsimem/test_ogr_pcidsk_add_field_to_non_empty_layer.pix"
     ds = ogr.GetDriverByName("PCIDSK").CreateDataSource(tmpfile)
-    lyr = ds.CreateLayer("foo")
-    lyr.CreateField(ogr.FieldDefn("foo", ogr.OFTString))
-    f = ogr.Feature(lyr.GetLayerDefn())
-    f["foo"] = "bar"
-    lyr.CreateFeature(f)
-    f = None
-    with gdaltest.error_handler():
-        assert lyr.CreateField(ogr.FieldDefn("bar", ogr.OFTString)) != 0
-    f = ogr.Feature(lyr.GetLayerDefn())
-    f["foo"] = "bar2"
-    lyr.CreateFeature(f)
-    f = None
-    ds = None
-
-    ogr.GetDriverByName("PCIDSK").DeleteDataSource(tmpfile)
+    try:
+        lyr = ds.CreateLayer("foo")
+        lyr.CreateField(ogr.FieldDefn("foo", ogr.OFTString))
+        f = ogr.Feature(lyr.GetLayerDefn())
+        f["foo"] = "bar"
+        lyr.CreateFeature(f)
+        f = None
+        with gdaltest.error_handler():
+            assert lyr.CreateField(ogr.FieldDefn("bar", ogr.OFTString)) != 0
+        f = ogr.Feature(lyr.GetLayerDefn())
+        f["foo"] = "bar2"
+        lyr.CreateFeature(f)
+        f = None
+    finally:
+        ds = None
+        ogr.GetDriverByName("PCIDSK").DeleteDataSource(tmpfile)
 
 
 ###############################################################################
@@ -259,35 +249,40 @@ def test_ogr_pcidsk_add_field_to_non_empty_layer():
 
 def test_ogr_pcidsk_too_many_layers():
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
-    tmpfile = "/vsimem/tmp.pix"
+    tmpfile = "/vsimem/test_ogr_pcidsk_too_many_layers.pix"
     ds = ogr.GetDriverByName("PCIDSK").CreateDataSource(tmpfile)
-    for i in range(1023):
-        ds.CreateLayer("foo%d" % i)
-    with gdaltest.error_handler():
-        assert ds.CreateLayer("foo") is None
-    ds = None
-
-    ogr.GetDriverByName("PCIDSK").DeleteDataSource(tmpfile)
+    try:
+        for i in range(1023):
+            ds.CreateLayer("foo%d" % i)
+        with gdaltest.error_handler():
+            assert ds.CreateLayer("foo") is None
+    finally:
+        ds = None
+        ogr.GetDriverByName("PCIDSK").DeleteDataSource(tmpfile)
 
 
 ###############################################################################
-# Check a polygon layer
+# Download the polygon test file once for the online tests
 
 
-def test_ogr_pcidsk_online_1():
-
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
+@pytest.fixture(scope="module")
+def polygon_pix():
 
     gdaltest.download_or_skip(
         "http://download.osgeo.org/gdal/data/pcidsk/sdk_testsuite/polygon.pix",
         "polygon.pix",
     )
 
-    ds = ogr.Open("tmp/cache/polygon.pix")
+    return "tmp/cache/polygon.pix"
+
+
+###############################################################################
+# Check a polygon layer
+
+
+def test_ogr_pcidsk_online_1(polygon_pix):
+
+    ds = ogr.Open(polygon_pix)
     assert ds is not None
 
     lyr = ds.GetLayer(0)
@@ -306,32 +301,15 @@ def test_ogr_pcidsk_online_1():
 # Check a polygon layer
 
 
-def test_ogr_pcidsk_online_2():
+def test_ogr_pcidsk_online_2(polygon_pix):
 
     import test_cli_utilities
 
     if test_cli_utilities.get_test_ogrsf_path() is None:
         pytest.skip()
 
-    if ogr.GetDriverByName("PCIDSK") is None:
-        pytest.skip()
-
-    gdaltest.download_or_skip(
-        "http://download.osgeo.org/gdal/data/pcidsk/sdk_testsuite/polygon.pix",
-        "polygon.pix",
-    )
-
     ret = gdaltest.runexternal(
-        test_cli_utilities.get_test_ogrsf_path() + " -ro tmp/cache/polygon.pix"
+        test_cli_utilities.get_test_ogrsf_path() + " -ro " + polygon_pix
     )
 
     assert ret.find("INFO") != -1 and ret.find("ERROR") == -1
-
-
-###############################################################################
-# Cleanup
-
-
-def test_ogr_pcidsk_cleanup():
-
-    gdal.Unlink("tmp/ogr_pcidsk_1.pix")
@@ -1202,9 +1202,9 @@ def download_file(
             if download_size >= 0:
                 sys.stdout.write("Progress: ")
             nLastTick = -1
-            val = "".encode("ascii")
+            val = bytearray()
             while len(val) < download_size or download_size < 0:
-                chunk_size = 1024
+                chunk_size = 65536
                 if download_size >= 0 and len(val) + chunk_size > download_size:
                     chunk_size = download_size - len(val)
                 try:
@@ -1214,10 +1214,11 @@ def download_file(
                     return False
                 if len(chunk) < chunk_size:
                     if download_size < 0:
+                        val += chunk
                         break
                     print("Did not get expected data length.")
                     return False
-                val = val + chunk
+                val += chunk
                 if download_size >= 0:
                     nThisTick = int(40 * len(val) / download_size)
                     while nThisTick > nLastTick:
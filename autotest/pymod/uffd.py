@@ -55,7 +55,8 @@ def uffd_compare(filename):
     ext = os.path.splitext(filename)[1]
     vsimem = "/vsimem/file{}".format(ext)
     filename2 = "./data/{}".format(filename)
-    gdal.FileFromMemBuffer(vsimem, open(filename2, "rb").read())
+    with open(filename2, "rb") as f:
+        gdal.FileFromMemBuffer(vsimem, f.read())
 
     dataset1 = gdal.Open(filename2)
     dataset2 = gdal.Open(vsimem)
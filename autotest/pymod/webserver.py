@@ -145,6 +145,12 @@ class SequentialHandler(object):
         )
         assert not self.req_resp_map
 
+    def reset(self):
+        """Forget all registered requests, so that the handler can be reused"""
+        self.req_count = 0
+        self.req_resp.clear()
+        self.req_resp_map.clear()
+
     def add(
         self,
         method,
@@ -120,8 +120,7 @@ void GDALRegister_HDF5()
 /************************************************************************/
 HDF5Dataset::HDF5Dataset()
     : hHDF5(-1), hGroupID(-1), papszSubDatasets(nullptr), nDatasetType(-1),
-      nSubDataCount(0), poH5RootGroup(nullptr), papszMetadata(nullptr),
-      poH5CurrentObject(nullptr)
+      nSubDataCount(0), poH5RootGroup(nullptr), poH5CurrentObject(nullptr)
 {
 }
 
@@ -130,7 +129,6 @@ HDF5Dataset::HDF5Dataset()
 /************************************************************************/
 HDF5Dataset::~HDF5Dataset()
 {
-    CSLDestroy(papszMetadata);
     if (hGroupID > 0)
         H5Gclose(hGroupID);
     if (hHDF5 > 0)
@@ -552,17 +550,16 @@ GDALDataset *HDF5Dataset::Open(GDALOpenInfo *poOpenInfo)
 
     poDS->ReadGlobalAttributes(true);
 
-    poDS->SetMetadata(poDS->papszMetadata);
-
-    if (STARTS_WITH(
-            CSLFetchNameValueDef(poDS->papszMetadata, "mission_name", ""),
-            "Sentinel 3") &&
-        EQUAL(CSLFetchNameValueDef(poDS->papszMetadata, "altimeter_sensor_name",
-                                   ""),
-              "SRAL") &&
-        EQUAL(CSLFetchNameValueDef(poDS->papszMetadata,
-                                   "radiometer_sensor_name", ""),
-              "MWR") &&
+    poDS->SetMetadata(poDS->m_aosMetadata.List());
+
+    if (STARTS_WITH(poDS->m_aosMetadata.FetchNameValueDef("mission_name", ""),
+                    "Sentinel 3") &&
+        EQUAL(
+            poDS->m_aosMetadata.FetchNameValueDef("altimeter_sensor_name", ""),
+            "SRAL") &&
+        EQUAL(
+            poDS->m_aosMetadata.FetchNameValueDef("radiometer_sensor_name", ""),
+            "MWR") &&
         GDALGetDriverByName("netCDF") != nullptr)
     {
         delete poDS;
@@ -1148,7 +1145,7 @@ static herr_t HDF5AttrIterate(hid_t hH5ObjID, const char *pszAttrName,
     H5Tclose(hAttrNativeType);
     H5Tclose(hAttrTypeID);
     H5Aclose(hAttrID);
-    poDS->papszMetadata = CSLSetNameValue(poDS->papszMetadata, osKey, szValue);
+    poDS->m_aosMetadata.SetNameValue(osKey, szValue);
 
     CPLFree(szData);
     CPLFree(szValue);
@@ -185,7 +185,7 @@ class HDF5Dataset CPL_NON_FINAL : public GDALPamDataset
                               int *nLen = nullptr);
 
   public:
-    char **papszMetadata;
+    CPLStringList m_aosMetadata{};
     HDF5GroupObjects *poH5CurrentObject;
 
     HDF5Dataset();
@@ -38,6 +38,7 @@
 #include "ogr_spatialref.h"
 
 #include <algorithm>
+#include <utility>
 
 class HDF5ImageDataset final : public HDF5Dataset
 {
@@ -253,9 +254,8 @@ HDF5ImageRasterBand::HDF5ImageRasterBand(HDF5ImageDataset *poDSIn, int nBandIn,
 
     // Take a copy of Global Metadata since  I can't pass Raster
     // variable to Iterate function.
-    char **papszMetaGlobal = CSLDuplicate(poDSIn->papszMetadata);
-    CSLDestroy(poDSIn->papszMetadata);
-    poDSIn->papszMetadata = nullptr;
+    CPLStringList aosMetaGlobal(std::move(poDSIn->m_aosMetadata));
+    poDSIn->m_aosMetadata.Clear();
 
     if (poDSIn->poH5Objects->nType == H5G_DATASET)
     {
@@ -264,11 +264,9 @@ HDF5ImageRasterBand::HDF5ImageRasterBand(HDF5ImageDataset *poDSIn, int nBandIn,
 
     // Recover Global Metadata and set Band Metadata.
 
-    SetMetadata(poDSIn->papszMetadata);
+    SetMetadata(poDSIn->m_aosMetadata.List());
 
-    CSLDestroy(poDSIn->papszMetadata);
-    poDSIn->papszMetadata = CSLDuplicate(papszMetaGlobal);
-    CSLDestroy(papszMetaGlobal);
+    poDSIn->m_aosMetadata = std::move(aosMetaGlobal);
 
     // Check for chunksize and set it as the blocksize (optimizes read).
     const hid_t listid = H5Dget_create_plist(poDSIn->dataset_id);
@@ -516,7 +514,7 @@ GDALDataset *HDF5ImageDataset::Open(GDALOpenInfo *poOpenInfo)
 
     // CSK code in IdentifyProductType() and CreateProjections()
     // uses dataset metadata.
-    poDS->SetMetadata(poDS->papszMetadata);
+    poDS->SetMetadata(poDS->m_aosMetadata.List());
 
     // Check if the hdf5 is a well known product type
     poDS->IdentifyProductType();
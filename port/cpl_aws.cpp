@@ -38,6 +38,7 @@
 #include "cpl_multiproc.h"
 #include "cpl_http.h"
 #include <algorithm>
+#include <mutex>
 
 // #define DEBUG_VERBOSE 1
 
@@ -72,6 +73,12 @@ static std::string gosSourceProfileSessionToken;
 static std::string gosRoleArnWebIdentity;
 static std::string gosWebIdentityTokenFile;
 
+// The below variables are used to cache the EC2 IMDSv2 token
+constexpr int IMDSV2_TOKEN_TTL = 21600;  // in seconds (6 hours)
+static std::string gosIMDSv2Token;
+static std::string gosIMDSv2TokenRootURL;
+static time_t gnIMDSv2TokenExpiration = 0;
+
 /************************************************************************/
 /*                         CPLGetLowerCaseHex()                         */
 /************************************************************************/
@@ -165,6 +172,83 @@ CPLString CPLAWSGetHeaderVal(const struct curl_slist *psExistingHeaders,
     return CPLString();
 }
 
+/************************************************************************/
+/*                    CPLGetAWS_SIGN4_SigningKey()                      */
+/************************************************************************/
+
+// The signing key only depends on the secret access key, the date, the
+// region and the service, so it is the same for all the requests issued
+// during a given day. Cache the last computed one to save the 4 chained
+// HMAC-SHA256 computations. The secret access key itself is not kept: the
+// cache is keyed on its SHA-256 hash.
+static std::mutex goSigningKeyCacheMutex;
+static GByte gabyCachedSecretAccessKeyHash[CPL_SHA256_HASH_SIZE] = {};
+static std::string gosCachedYYMMDD;
+static std::string gosCachedRegion;
+static std::string gosCachedService;
+static GByte gabyCachedSigningKey[CPL_SHA256_HASH_SIZE] = {};
+
+static void CPLClearAWS_SIGN4_SigningKeyCache()
+{
+    std::lock_guard<std::mutex> oLock(goSigningKeyCacheMutex);
+    memset(gabyCachedSecretAccessKeyHash, 0, CPL_SHA256_HASH_SIZE);
+    gosCachedYYMMDD.clear();
+    gosCachedRegion.clear();
+    gosCachedService.clear();
+    memset(gabyCachedSigningKey, 0, CPL_SHA256_HASH_SIZE);
+}
+
+static void CPLGetAWS_SIGN4_SigningKey(
+    const std::string &osSecretAccessKey, const std::string &osYYMMDD,
+    const std::string &osRegion, const std::string &osService,
+    GByte abySigningKey[CPL_SHA256_HASH_SIZE])
+{
+    GByte abySecretAccessKeyHash[CPL_SHA256_HASH_SIZE] = {};
+    CPL_SHA256(osSecretAccessKey.c_str(), osSecretAccessKey.size(),
+               abySecretAccessKeyHash);
+
+    {
+        std::lock_guard<std::mutex> oLock(goSigningKeyCacheMutex);
+        if (!gosCachedYYMMDD.empty() &&
+            memcmp(gabyCachedSecretAccessKeyHash, abySecretAccessKeyHash,
+                   CPL_SHA256_HASH_SIZE) == 0 &&
+            gosCachedYYMMDD == osYYMMDD && gosCachedRegion == osRegion &&
+            gosCachedService == osService)
+        {
+            memcpy(abySigningKey, gabyCachedSigningKey, CPL_SHA256_HASH_SIZE);
+            return;
+        }
+    }
+
+    GByte abySigningKeyIn[CPL_SHA256_HASH_SIZE] = {};
+    GByte abySigningKeyOut[CPL_SHA256_HASH_SIZE] = {};
+
+    const std::string osFirstKey(std::string("AWS4") + osSecretAccessKey);
+    CPL_HMAC_SHA256(osFirstKey.c_str(), osFirstKey.size(), osYYMMDD.c_str(),
+                    osYYMMDD.size(), abySigningKeyOut);
+    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
+
+    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, osRegion.c_str(),
+                    osRegion.size(), abySigningKeyOut);
+    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
+
+    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, osService.c_str(),
+                    osService.size(), abySigningKeyOut);
+    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
+
+    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, "aws4_request",
+                    strlen("aws4_request"), abySigningKeyOut);
+    memcpy(abySigningKey, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
+
+    std::lock_guard<std::mutex> oLock(goSigningKeyCacheMutex);
+    memcpy(gabyCachedSecretAccessKeyHash, abySecretAccessKeyHash,
+           CPL_SHA256_HASH_SIZE);
+    gosCachedYYMMDD = osYYMMDD;
+    gosCachedRegion = osRegion;
+    gosCachedService = osService;
+    memcpy(gabyCachedSigningKey, abySigningKey, CPL_SHA256_HASH_SIZE);
+}
+
 /************************************************************************/
 /*                 CPLGetAWS_SIGN4_Signature()                          */
 /************************************************************************/
@@ -249,24 +333,8 @@ CPLString CPLGetAWS_SIGN4_Signature(
     /*      Compute signing key.                                            */
     /* -------------------------------------------------------------------- */
     GByte abySigningKeyIn[CPL_SHA256_HASH_SIZE] = {};
-    GByte abySigningKeyOut[CPL_SHA256_HASH_SIZE] = {};
-
-    CPLString osFirstKey(CPLString("AWS4") + osSecretAccessKey);
-    CPL_HMAC_SHA256(osFirstKey.c_str(), osFirstKey.size(), osYYMMDD,
-                    osYYMMDD.size(), abySigningKeyOut);
-    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
-
-    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, osRegion.c_str(),
-                    osRegion.size(), abySigningKeyOut);
-    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
-
-    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, osService.c_str(),
-                    osService.size(), abySigningKeyOut);
-    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
-
-    CPL_HMAC_SHA256(abySigningKeyIn, CPL_SHA256_HASH_SIZE, "aws4_request",
-                    strlen("aws4_request"), abySigningKeyOut);
-    memcpy(abySigningKeyIn, abySigningKeyOut, CPL_SHA256_HASH_SIZE);
+    CPLGetAWS_SIGN4_SigningKey(osSecretAccessKey, osYYMMDD, osRegion, osService,
+                               abySigningKeyIn);
 
 #ifdef DEBUG_VERBOSE
     CPLString osSigningKey(
@@ -854,15 +922,28 @@ bool VSIS3HandleHelper::GetConfigurationFromEC2(
         // Use IMDSv2 protocol:
         // https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/configuring-instance-metadata-service.html
 
-        // Retrieve IMDSv2 token
+        // Reuse the IMDSv2 token if it is still valid, but keep a minute of
+        // margin...
+        time_t nCurTime;
+        time(&nCurTime);
+        if (!gosIMDSv2Token.empty() && gosIMDSv2TokenRootURL == osEC2RootURL &&
+            nCurTime < gnIMDSv2TokenExpiration - 60)
         {
+            osToken = gosIMDSv2Token;
+        }
+        else
+        {
+            // Retrieve IMDSv2 token
+            gosIMDSv2Token.clear();
             const CPLString osEC2_IMDSv2_api_token_URL =
                 osEC2RootURL + "/latest/api/token";
             CPLStringList aosOptions;
             aosOptions.SetNameValue("TIMEOUT", "1");
             aosOptions.SetNameValue("CUSTOMREQUEST", "PUT");
-            aosOptions.SetNameValue("HEADERS",
-                                    "X-aws-ec2-metadata-token-ttl-seconds: 10");
+            aosOptions.SetNameValue(
+                "HEADERS",
+                CPLSPrintf("X-aws-ec2-metadata-token-ttl-seconds: %d",
+                           IMDSV2_TOKEN_TTL));
             CPLPushErrorHandler(CPLQuietErrorHandler);
             CPLHTTPResult *psResult =
                 CPLHTTPFetch(osEC2_IMDSv2_api_token_URL, aosOptions.List());
@@ -872,6 +953,9 @@ bool VSIS3HandleHelper::GetConfigurationFromEC2(
                 if (psResult->nStatus == 0 && psResult->pabyData != nullptr)
                 {
                     osToken = reinterpret_cast<char *>(psResult->pabyData);
+                    gosIMDSv2Token = osToken;
+                    gosIMDSv2TokenRootURL = osEC2RootURL;
+                    gnIMDSv2TokenExpiration = nCurTime + IMDSV2_TOKEN_TTL;
                 }
                 else
                 {
@@ -960,6 +1044,7 @@ bool VSIS3HandleHelper::GetConfigurationFromEC2(
             {
                 // We didn't get the IAM role. We are definitely not running
                 // on EC2 or an emulation of it.
+                gosIMDSv2Token.clear();
                 return false;
             }
         }
@@ -1003,7 +1088,13 @@ bool VSIS3HandleHelper::GetConfigurationFromEC2(
         CPLDebug("AWS", "Storing AIM credentials until %s",
                  osExpiration.c_str());
     }
-    return !osAccessKeyId.empty() && !osSecretAccessKey.empty();
+    if (osAccessKeyId.empty() || osSecretAccessKey.empty())
+    {
+        // The token might have been revoked: do not reuse it
+        gosIMDSv2Token.clear();
+        return false;
+    }
+    return true;
 }
 
 /************************************************************************/
@@ -1654,6 +1745,10 @@ void VSIS3HandleHelper::ClearCache()
     gosGlobalSecretAccessKey.clear();
     gosGlobalSessionToken.clear();
     gnGlobalExpiration = 0;
+    gosIMDSv2Token.clear();
+    gosIMDSv2TokenRootURL.clear();
+    gnIMDSv2TokenExpiration = 0;
+    CPLClearAWS_SIGN4_SigningKeyCache();
     gosRoleArn.clear();
     gosExternalId.clear();
     gosMFASerial.clear();
@@ -132,13 +132,16 @@ int VSIUploadOnCloseHandle::Close()
     VSIFSeekL(m_fpTemp, 0, SEEK_SET);
     constexpr size_t CHUNK_SIZE = 1024 * 1024;
     vsi_l_offset nOffset = 0;
-    std::vector<GByte> abyBuffer(CHUNK_SIZE);
+    // Do not allocate more than needed for small files, which are the
+    // common case (e.g. a GTiff written through CreateCopy())
+    std::vector<GByte> abyBuffer(static_cast<size_t>(
+        std::min(nSize, static_cast<vsi_l_offset>(CHUNK_SIZE))));
     while (nOffset < nSize)
     {
         size_t nToRead = static_cast<size_t>(
             std::min(nSize - nOffset, static_cast<vsi_l_offset>(CHUNK_SIZE)));
-        if (VSIFReadL(&abyBuffer[0], nToRead, 1, m_fpTemp) != 1 ||
-            m_poBaseHandle->Write(&abyBuffer[0], nToRead, 1) != 1)
+        if (VSIFReadL(abyBuffer.data(), nToRead, 1, m_fpTemp) != 1 ||
+            m_poBaseHandle->Write(abyBuffer.data(), nToRead, 1) != 1)
         {
             VSIFCloseL(m_fpTemp);
             m_fpTemp = nullptr;